@@ -0,0 +1,285 @@
+"""
+Columnar export of annotations.
+
+Annotations are written in chunks of fixed size into a directory::
+
+    dictionary.json         Taxon and tag dictionaries
+    chunk-00000/
+        object_id.npy       Object IDs (str)
+        taxon.npy           Pre-order index of the taxon in the tree (int32, -1: none)
+        tag_object.npy      Row of the tagged object, counted over all chunks (int64)
+        tag.npy             Index of the tag path in the tag dictionary (int32)
+        positive.npy        False if the tag is rejected (bool)
+    chunk-00001/
+        ...
+
+Each column is a plain .npy file that can be memory-mapped chunk by chunk
+(see iter_chunks). Taxa and tags are dictionary-encoded, which maps directly
+to pandas.Categorical or pyarrow.DictionaryArray.
+
+NumPy (and pandas for to_dataframes) is imported on first use.
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .tree import Node
+
+DICTIONARY_FN = "dictionary.json"
+
+OBJECT_COLUMNS = ("object_id", "taxon")
+TAG_COLUMNS = ("tag_object", "tag", "positive")
+
+
+def _chunk_dir(directory: str, i: int):
+    return os.path.join(directory, f"chunk-{i:05d}")
+
+
+class AnnotationWriter:
+    """
+    Write annotations in columnar, dictionary-encoded form.
+
+    Usage::
+
+        with AnnotationWriter("annotations", tree) as writer:
+            writer.add("object_001", taxon_id, [(("sex", "female"), False)])
+    """
+
+    def __init__(self, directory: str, tree: Node, *, chunk_size: int = 2 ** 16):
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+        nodes = list(tree.walk())
+        self.taxa = ["/".join(n.path) for n in nodes]
+        self.taxon_index = {n.id: i for i, n in enumerate(nodes) if n.id is not None}
+
+        self.tag_paths: List[Tuple[str, ...]] = []
+        self.tag_index: Dict[Tuple[str, ...], int] = {}
+
+        self.n_chunks = 0
+        self.n_objects = 0
+
+        self._reset()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _reset(self):
+        self._object_id: List[str] = []
+        self._taxon: List[int] = []
+        self._tag_object: List[int] = []
+        self._tag: List[int] = []
+        self._positive: List[bool] = []
+
+    def _encode_tag(self, path: Sequence[str]) -> int:
+        path = tuple(path)
+        try:
+            return self.tag_index[path]
+        except KeyError:
+            idx = self.tag_index[path] = len(self.tag_paths)
+            self.tag_paths.append(path)
+            return idx
+
+    def add(
+        self,
+        object_id: str,
+        taxon_id: Optional[str],
+        tags: Iterable[Tuple[Sequence[str], bool]] = (),
+    ):
+        """
+        Add an object.
+
+        Args:
+            object_id: ID of the object.
+            taxon_id: ID of the taxon (see parse.insert_id) or None.
+            tags: Pairs of tag path and reject flag.
+        """
+
+        if taxon_id is None:
+            taxon = -1
+        else:
+            try:
+                taxon = self.taxon_index[taxon_id]
+            except KeyError:
+                raise ValueError(f"Unknown taxon: {taxon_id!r}") from None
+
+        row = self.n_objects
+        self._object_id.append(object_id)
+        self._taxon.append(taxon)
+
+        for path, reject in tags:
+            self._tag_object.append(row)
+            self._tag.append(self._encode_tag(path))
+            self._positive.append(not reject)
+
+        self.n_objects += 1
+
+        if len(self._object_id) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the current chunk."""
+        import numpy as np
+
+        if not self._object_id:
+            return
+
+        columns = {
+            "object_id": np.array(self._object_id, dtype=str),
+            "taxon": np.array(self._taxon, dtype=np.int32),
+            "tag_object": np.array(self._tag_object, dtype=np.int64),
+            "tag": np.array(self._tag, dtype=np.int32),
+            "positive": np.array(self._positive, dtype=bool),
+        }
+
+        chunk_dir = _chunk_dir(self.directory, self.n_chunks)
+        os.makedirs(chunk_dir, exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(chunk_dir, f"{name}.npy"), values)
+
+        self.n_chunks += 1
+        self._reset()
+
+    def close(self):
+        """Write the last chunk and the dictionary."""
+        self.flush()
+
+        with open(os.path.join(self.directory, DICTIONARY_FN), "w") as f:
+            json.dump(
+                {
+                    "taxa": self.taxa,
+                    "tags": [list(p) for p in self.tag_paths],
+                    "n_chunks": self.n_chunks,
+                    "n_objects": self.n_objects,
+                },
+                f,
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Without dictionary.json, an aborted export can not be mistaken for a
+        # complete one
+        if exc_type is None:
+            self.close()
+
+
+def read_dictionary(directory: str) -> Dict:
+    with open(os.path.join(directory, DICTIONARY_FN)) as f:
+        return json.load(f)
+
+
+def iter_chunks(directory: str, *, mmap: bool = True) -> Iterator[Dict]:
+    """Iterate over the chunks of an export, yielding a dict of column arrays."""
+    import numpy as np
+
+    mmap_mode = "r" if mmap else None
+
+    for i in range(read_dictionary(directory)["n_chunks"]):
+        chunk_dir = _chunk_dir(directory, i)
+        yield {
+            name: np.load(os.path.join(chunk_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in OBJECT_COLUMNS + TAG_COLUMNS
+        }
+
+
+def read_annotations(directory: str, *, mmap: bool = True) -> Dict:
+    """
+    Read all columns of an export.
+
+    A single chunk is returned as-is (memory-mapped, if requested).
+    Multiple chunks are concatenated, which copies them into memory.
+    Use iter_chunks to process large exports without loading them completely.
+    """
+    import numpy as np
+
+    chunks = list(iter_chunks(directory, mmap=mmap))
+
+    if len(chunks) == 1:
+        return chunks[0]
+
+    if not chunks:
+        return {
+            "object_id": np.array([], dtype=str),
+            "taxon": np.array([], dtype=np.int32),
+            "tag_object": np.array([], dtype=np.int64),
+            "tag": np.array([], dtype=np.int32),
+            "positive": np.array([], dtype=bool),
+        }
+
+    return {
+        name: np.concatenate([c[name] for c in chunks])
+        for name in OBJECT_COLUMNS + TAG_COLUMNS
+    }
+
+
+def _tag_categories(dictionary: Dict) -> List[str]:
+    # Tag names can not contain "=" (see parse.Tag), so the tag name is unambiguous
+    return ["=".join(p) for p in dictionary["tags"]]
+
+
+def _dataframes(columns: Dict, taxa: List[str], tags: List[str], offset: int = 0):
+    import pandas as pd
+
+    # Objects are indexed by their row over all chunks, which tag_object refers to
+    n_objects = len(columns["object_id"])
+    objects = pd.DataFrame(
+        {
+            "object_id": columns["object_id"],
+            "taxon": pd.Categorical.from_codes(columns["taxon"], categories=taxa),
+        },
+        index=pd.RangeIndex(offset, offset + n_objects),
+        copy=False,
+    )
+
+    tags = pd.DataFrame(
+        {
+            "tag_object": columns["tag_object"],
+            "tag": pd.Categorical.from_codes(columns["tag"], categories=tags),
+            "positive": columns["positive"],
+        },
+        copy=False,
+    )
+
+    return objects, tags
+
+
+def iter_dataframes(directory: str, *, mmap: bool = True):
+    """
+    Iterate over the chunks of an export as pandas DataFrames.
+
+    The objects of each chunk are indexed by their row over all chunks,
+    so tags.join(objects, on="tag_object") works per chunk.
+
+    Yields:
+        (objects, tags): See to_dataframes.
+    """
+    dictionary = read_dictionary(directory)
+    tags = _tag_categories(dictionary)
+
+    offset = 0
+    for columns in iter_chunks(directory, mmap=mmap):
+        yield _dataframes(columns, dictionary["taxa"], tags, offset)
+        offset += len(columns["object_id"])
+
+
+def to_dataframes(directory: str, *, mmap: bool = True):
+    """
+    Load a complete export into pandas.
+
+    Taxa and tags become categoricals built from the stored codes without
+    re-encoding. Tags are labeled "name=value".
+
+    The chunks are concatenated (see read_annotations) and pandas converts
+    object_id into Python strings, so both are copies.
+    Use iter_dataframes to process large exports chunk by chunk.
+
+    Returns:
+        (objects, tags): DataFrames with columns object_id, taxon and
+            tag_object, tag, positive.
+    """
+    dictionary = read_dictionary(directory)
+    columns = read_annotations(directory, mmap=mmap)
+
+    return _dataframes(columns, dictionary["taxa"], _tag_categories(dictionary))
@@ -0,0 +1,39 @@
+"""Database backend.
+
+SQLAlchemy and its helpers are only imported when one of the names below is
+first accessed, so that importing :mod:`silverturtle` (or the parser and tree
+modules) stays cheap.
+"""
+
+import importlib
+
+# Public name => submodule that defines it
+_LAZY = {
+    "metadata": "models",
+    "objects": "models",
+    "NodeID": "models",
+    "Base": "taxonomy",
+    "Taxon": "taxonomy",
+    "Tag": "taxonomy",
+    "ObjectTag": "taxonomy",
+    "Object": "taxonomy",
+    "Concept": "taxonomy",
+    "export_annotations": "export",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    try:
+        module_name = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,39 @@
+import itertools
+
+from sqlalchemy.orm.session import Session
+from sqlalchemy.sql import select
+
+from ..columnar import AnnotationWriter
+from ..tree import Node
+from .taxonomy import Object, ObjectTag
+
+
+def export_annotations(
+    session: Session, tree: Node, directory: str, *, chunk_size: int = 2 ** 16
+):
+    """
+    Export all objects and their tags into directory (see silverturtle.columnar).
+
+    Rows are streamed from the database without constructing ORM objects.
+    """
+
+    stmt = (
+        select(Object.id, Object.taxon_id, ObjectTag.tag, ObjectTag.reject)
+        .outerjoin(ObjectTag, ObjectTag.object_id == Object.id)
+        .order_by(Object.id)
+    )
+
+    rows = session.execute(stmt).yield_per(chunk_size)
+
+    with AnnotationWriter(directory, tree, chunk_size=chunk_size) as writer:
+        for object_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            taxon_id = group[0][1]
+            if taxon_id is not None:
+                taxon_id = taxon_id.hex
+
+            tags = [(tag, reject) for _, _, tag, reject in group if tag is not None]
+
+            writer.add(object_id, taxon_id, tags)
+
+    return writer
@@ -7,8 +7,10 @@ from sqlalchemy.sql import select
 from sqlalchemy.sql import exists
 from sqlalchemy.sql.schema import Column
 from sqlalchemy.sql.selectable import Select
-from sqlalchemy.sql.sqltypes import ARRAY, Boolean, String
+from sqlalchemy.sql.sqltypes import ARRAY, JSON, Boolean, Integer, String
+from sqlalchemy.types import UserDefinedType
 
+from ..instrument import timed
 from .models import NodeID, objects
 
 from sqlalchemy.orm import declarative_base, deferred, relationship
@@ -23,6 +25,9 @@ class Taxon(Base):
     __tablename__ = "taxons"
     id = Column(UUIDType(), primary_key=True)
     parent_id = Column(ForeignKey("taxons.id"))
+    # Merkle hash of the subtree (see parse.subtree_hash).
+    # Unchanged subtrees can be skipped when syncing.
+    hash = Column(String(64))
 
     @classmethod
     def root(cls, session: Session) -> "Taxon":
@@ -33,8 +38,13 @@ class Taxon(Base):
         session.query(Taxon)
 
 
-class CUBE:
-    pass
+class CUBE(UserDefinedType):
+    """Cube type of the PostgreSQL cube extension."""
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "CUBE"
 
 
 @dataclass
@@ -44,17 +54,22 @@ class Tag:
 
 
 class ObjectTag(Base):
+    __tablename__ = "object_tags"
+
+    id = Column(Integer, primary_key=True)
     object_id = Column(ForeignKey("objects.id"))
-    tag = Column(ARRAY(String))
+    # Arrays are stored as JSON where they are not supported (e.g. for tests)
+    tag = Column(ARRAY(String).with_variant(JSON(), "sqlite"))
     reject = Column(Boolean)
 
     def as_tag(self):
         return Tag(tuple(self.tag), self.reject)  # type: ignore
 
 
-class Object(base):  # type: ignore
+class Object(Base):  # type: ignore
     __tablename__ = "objects"
 
+    id = Column(String, primary_key=True)
     taxon_id = Column(ForeignKey("taxons.id"))
     vector = deferred(Column(CUBE))
     tags = relationship("ObjectTag")
@@ -74,6 +89,7 @@ class Concept:
     def from_json(cls, data, session: Session):
         ...
 
+    @timed("db.Concept.query_extension")
     def query_extension(self, session: Session):
         query = session.query(Object)
 
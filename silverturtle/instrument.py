@@ -0,0 +1,265 @@
+"""
+Instrumentation of parse, tree and query stages.
+
+Functions decorated with :func:`timed` report their runtime to all registered
+hooks. Without registered hooks, the only overhead is a single check.
+
+Usage::
+
+    with profile() as profiler:
+        ast = gen_ast(lines)
+
+    print(profiler.report())
+"""
+
+import contextlib
+import functools
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Code flag of generator functions (inspect.CO_GENERATOR, without importing inspect)
+_CO_GENERATOR = 0x20
+
+
+class Hook:
+    """Base class for instrumentation hooks."""
+
+    def timing(self, stage: str, seconds: float):
+        """Called when a call to stage finished."""
+
+    def count(self, name: str, value: int):
+        """Called when a counter is incremented."""
+
+    def sql(self, statement: str, seconds: float, rows: Optional[int]):
+        """
+        Called when an SQL statement was executed.
+
+        seconds covers the execution only, not fetching the results.
+        rows is None if the driver does not report it (e.g. SELECT in SQLite).
+        """
+
+
+_hooks: List[Hook] = []
+_local = threading.local()
+
+
+def add_hook(hook: Hook):
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Hook):
+    _hooks.remove(hook)
+
+
+def is_enabled() -> bool:
+    """True if any hooks are registered."""
+    return bool(_hooks)
+
+
+def count(name: str, value: int = 1):
+    if not _hooks:
+        return
+
+    for hook in _hooks:
+        hook.count(name, value)
+
+
+def _emit_timing(stage: str, seconds: float):
+    for hook in _hooks:
+        hook.timing(stage, seconds)
+
+
+def _active_stages() -> set:
+    try:
+        return _local.active
+    except AttributeError:
+        active = _local.active = set()
+        return active
+
+
+def _timed_generator(stage: str, gen):
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration as exc:
+                return exc.value
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        gen.close()
+        _emit_timing(stage, elapsed)
+
+
+def timed(stage: str):
+    """
+    Report the runtime of the decorated function as stage.
+
+    Only the outermost call of a stage is reported, so that recursive functions
+    are not counted multiple times. For generator functions, the time spent
+    producing items is reported when the generator is exhausted or closed.
+
+    Recursive functions should decorate only their entry point and recurse
+    through an undecorated helper, so that the check is not paid per call.
+    """
+
+    def decorator(func):
+        if func.__code__.co_flags & _CO_GENERATOR:
+
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                # Return the generator itself, without an additional layer
+                if not _hooks:
+                    return func(*args, **kwargs)
+
+                return _timed_generator(stage, func(*args, **kwargs))
+
+            return gen_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return func(*args, **kwargs)
+
+            active = _active_stages()
+            if stage in active:
+                return func(*args, **kwargs)
+
+            active.add(stage)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _emit_timing(stage, time.perf_counter() - start)
+                active.discard(stage)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_engine(engine):
+    """
+    Report SQL statements executed by a SQLAlchemy engine to the hooks.
+
+    The cursor events only cover the execution of a statement.
+    Fetching the results is not included in the timing, and the row count
+    is only known where the driver reports it.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        if _hooks:
+            conn.info.setdefault("silverturtle_query_start", []).append(
+                time.perf_counter()
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        starts = conn.info.get("silverturtle_query_start")
+        if not starts:
+            return
+
+        seconds = time.perf_counter() - starts.pop()
+        rows = cursor.rowcount if cursor.rowcount >= 0 else None
+
+        for hook in _hooks:
+            hook.sql(statement, seconds, rows)
+            hook.timing("sql", seconds)
+            if rows is not None:
+                hook.count("sql.rows", rows)
+
+
+class Profiler(Hook):
+    """Hook that aggregates timings, counters and SQL statements."""
+
+    def __init__(self):
+        # stage => [calls, seconds]
+        self.timings: Dict[str, List] = {}
+        self.counters: Dict[str, int] = {}
+        # statement => [calls, seconds, rows (None if unknown)]
+        self.statements: Dict[str, List] = {}
+
+    def timing(self, stage: str, seconds: float):
+        entry = self.timings.setdefault(stage, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def count(self, name: str, value: int):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def sql(self, statement: str, seconds: float, rows: Optional[int]):
+        entry = self.statements.setdefault(statement, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += seconds
+        if rows is None or entry[2] is None:
+            entry[2] = None
+        else:
+            entry[2] += rows
+
+    def report(self, n_statements: Optional[int] = 10) -> str:
+        lines = [f"{'stage':<30} {'calls':>8} {'total [s]':>10} {'mean [ms]':>10}"]
+        for stage, (calls, seconds) in sorted(
+            self.timings.items(), key=lambda kv: kv[1][1], reverse=True
+        ):
+            mean = 1000 * seconds / calls
+            lines.append(f"{stage:<30} {calls:>8} {seconds:>10.4f} {mean:>10.3f}")
+
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<30} {'value':>8}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<30} {value:>8}")
+
+        if self.statements and n_statements:
+            lines.append("")
+            lines.append(f"{'calls':>8} {'total [s]':>10} {'rows':>8}  statement")
+            for statement, (calls, seconds, rows) in sorted(
+                self.statements.items(), key=lambda kv: kv[1][1], reverse=True
+            )[:n_statements]:
+                statement = " ".join(statement.split())
+                rows = "?" if rows is None else rows
+                lines.append(f"{calls:>8} {seconds:>10.4f} {rows:>8}  {statement}")
+
+        return "\n".join(lines)
+
+
+def replay(profiler: Profiler, *, prefix: str = ""):
+    """
+    Report the measurements of profiler to the registered hooks.
+
+    Used to forward measurements from worker processes.
+    Timings are reported as one call per stage.
+    """
+    if not _hooks:
+        return
+
+    for stage, (_, seconds) in profiler.timings.items():
+        _emit_timing(prefix + stage, seconds)
+
+    for name, value in profiler.counters.items():
+        count(name, value)
+
+    for hook in _hooks:
+        for statement, (_, seconds, rows) in profiler.statements.items():
+            hook.sql(statement, seconds, rows)
+
+
+@contextlib.contextmanager
+def profile():
+    """Collect timings in a Profiler while the context is active."""
+    profiler = Profiler()
+    add_hook(profiler)
+    try:
+        yield profiler
+    finally:
+        remove_hook(profiler)
@@ -1,9 +1,21 @@
 import re
 from typing import Iterable, List, Mapping, Optional, Tuple
+import hashlib
 import itertools
+import json
+import os.path
 import textwrap
 import uuid
 
+if __name__ == "__main__" and not __package__:
+    # Run as a script (python silverturtle/parse.py): Make the package importable
+    # instead of the modules next to this file. Prefer python -m silverturtle.parse.
+    import sys
+
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from silverturtle.instrument import Profiler, count, is_enabled, profile, replay, timed
+
 
 class Block(List["Expression"]):
     def __init__(self, it=None, *, parent: Optional["Block"] = None, indent=None):
@@ -86,10 +98,12 @@ class ParserError(Exception):
     pass
 
 
-def gen_ast(lines: Iterable[str]):
+@timed("parse.gen_ast")
+def gen_ast(lines: Iterable[str], *, line_offset: int = 0):
     root = Block()
     current_block: Block = root
-    for line_no, line in enumerate(lines, start=1):
+    line_no = line_offset
+    for line_no, line in enumerate(lines, start=line_offset + 1):
         line = line.rstrip()
 
         indent, content = split_line(line)
@@ -148,6 +162,8 @@ def gen_ast(lines: Iterable[str]):
         ):
             raise ParserError(f"Can not parse line {line_no}: {line!r}")
 
+    count("parse.lines", line_no - line_offset)
+
     return root
 
 
@@ -169,9 +185,14 @@ def build_node(node: Node, block: Optional[Block] = None):
     pass
 
 
+@timed("parse.ast2dict")
 def ast2dict(block: Block, data=None):
     if data is None:
         data = {}
+    return _ast2dict(block, data)
+
+
+def _ast2dict(block: Block, data: dict):
     doc = []
     child = None
     for expr in block:
@@ -184,7 +205,7 @@ def ast2dict(block: Block, data=None):
         elif type(expr) == Node:
             child = data.setdefault("children", {})[expr.args[0]] = {}
         elif type(expr) == Block:
-            ast2dict(expr, child)
+            _ast2dict(expr, child)
         elif type(expr) == Alias:
             data.setdefault("aliases", []).append(expr.args[0])
         elif type(expr) == Tag:
@@ -205,6 +226,119 @@ def ast2dict(block: Block, data=None):
     return data
 
 
+def split_sections(lines: List[str], chunk_size: int) -> List[Tuple[int, List[str]]]:
+    """
+    Split lines into chunks (of at least chunk_size lines) to be parsed independently.
+
+    Chunks are split before nodes at the initial indentation,
+    where the parser is always back at the root block.
+
+    Returns:
+        List of (line_offset, lines).
+    """
+    if not lines:
+        return []
+
+    base_indent = split_line(lines[0].rstrip())[0]
+
+    chunks = []
+    start = 0
+    for i in range(chunk_size, len(lines)):
+        if i - start < chunk_size:
+            continue
+
+        indent, content = split_line(lines[i].rstrip())
+        if indent == base_indent and Node.regex.match(content.split(" #", 1)[0]):
+            chunks.append((start, lines[start:i]))
+            start = i
+
+    chunks.append((start, lines[start:]))
+
+    return chunks
+
+
+def _parse_chunk(
+    chunk: Tuple[int, List[str]], profiling: bool
+) -> Tuple[dict, Optional[Profiler]]:
+    line_offset, lines = chunk
+
+    if not profiling:
+        # Return plain dicts, pickling a Block tree costs more than parsing it
+        return ast2dict(gen_ast(lines, line_offset=line_offset)), None
+
+    # Hooks of the parent process are not available in the worker,
+    # so measurements are collected here and replayed in the parent
+    with profile() as profiler:
+        data = ast2dict(gen_ast(lines, line_offset=line_offset))
+    return data, profiler
+
+
+def _merge_root(data: dict, chunk: dict):
+    for k, v in chunk.items():
+        if k == "doc":
+            data.setdefault(k, v)
+        elif k == "aliases":
+            data.setdefault(k, []).extend(v)
+        else:
+            data.setdefault(k, {}).update(v)
+
+
+# Below this number of lines, starting a process pool costs more than it saves
+MIN_PARALLEL_LINES = 50000
+
+
+@timed("parse.parse_parallel")
+def parse_parallel(
+    lines: Iterable[str],
+    *,
+    max_workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    min_lines: int = MIN_PARALLEL_LINES,
+) -> dict:
+    """
+    Parse lines into a dict like ast2dict(gen_ast(lines)), using a process pool.
+
+    The input is split at top-level nodes (see split_sections), the chunks are
+    parsed in parallel and the resulting dicts are merged.
+    Line numbers in ParserErrors refer to the complete input.
+
+    Inputs shorter than min_lines (or a single worker) are parsed serially.
+
+    When instrumentation hooks are registered, the workers' timings are
+    reported with the prefix "worker." and their counters are added up.
+    """
+    import concurrent.futures
+
+    lines = list(lines)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers < 2 or len(lines) < min_lines:
+        return ast2dict(gen_ast(lines))
+
+    if chunk_size is None:
+        chunk_size = max(1, len(lines) // max_workers)
+
+    chunks = split_sections(lines, chunk_size)
+
+    if len(chunks) < 2:
+        return ast2dict(gen_ast(lines))
+
+    profiling = is_enabled()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        data: dict = {}
+        for chunk_data, profiler in executor.map(
+            _parse_chunk, chunks, itertools.repeat(profiling)
+        ):
+            _merge_root(data, chunk_data)
+            if profiler is not None:
+                replay(profiler, prefix="worker.")
+
+    return data
+
+
 def compare_blocks(block1: Block, block2: Block):
     def _comparison():
         for expr1, expr2 in itertools.zip_longest(block1, block2):
@@ -240,51 +374,156 @@ def children_to_list(d: dict, name):
     return d
 
 
-def insert_id(d: dict):
-    d = d.copy()
+# Namespace for deterministic node IDs
+ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://github.com/moi90/silverturtle")
+
+
+def node_id(name: str, parent_id: Optional[str] = None) -> str:
+    """Derive a stable ID for a node from its name and the ID of its parent."""
+    if parent_id is None:
+        return uuid.uuid5(ID_NAMESPACE, name).hex
+    return uuid.uuid5(ID_NAMESPACE, f"{parent_id}/{name}").hex
+
+
+def insert_id(
+    d: Optional[dict], *, name: str = "", parent_id: Optional[str] = None
+):
+    """
+    Insert a stable ID into d and all of its descendants.
+
+    The ID is derived from the path of the node.
+    An explicit "id" is kept and its descendants are derived from it,
+    so that they keep their IDs when it is moved or renamed.
+    """
+    d = dict(d or {})
     if "id" not in d:
-        d["id"] = uuid.uuid4().hex
+        d["id"] = node_id(name, parent_id)
+
+    if "children" in d:
+        d["children"] = {
+            k: insert_id(v, name=k, parent_id=d["id"])
+            for k, v in d["children"].items()
+        }
+
+    return d
+
+
+# Keys that are not part of the content of a node
+_HASH_EXCLUDE = {"id", "hash", "children"}
+
+
+def _node_hash(d: dict, name: str, child_hashes: Mapping[str, str]) -> str:
+    content = {k: v for k, v in d.items() if k not in _HASH_EXCLUDE}
+    content["name"] = name
+    content["children"] = [[k, child_hashes[k]] for k in sorted(child_hashes)]
+
+    data = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def subtree_hash(d: Optional[dict], name: str = "") -> str:
+    """
+    Calculate a Merkle hash of a node and its descendants.
+
+    The hash covers the name, tags, meta, aliases and doc of the node and the
+    hashes of its children, so that unchanged subtrees can be recognized
+    across versions.
+    """
+    if not d:
+        d = {}
+
+    child_hashes = {k: subtree_hash(v, k) for k, v in d.get("children", {}).items()}
+    return _node_hash(d, name, child_hashes)
+
+
+def insert_hash(d: Optional[dict], *, name: str = ""):
+    """Insert the Merkle hash (see subtree_hash) into d and all of its descendants."""
+    d = dict(d or {})
 
     if "children" in d:
-        d["children"] = {k: insert_id(v) for k, v in d["children"].items()}
+        d["children"] = {k: insert_hash(v, name=k) for k, v in d["children"].items()}
+        child_hashes = {k: v["hash"] for k, v in d["children"].items()}
+    else:
+        child_hashes = {}
+
+    d["hash"] = _node_hash(d, name, child_hashes)
 
     return d
 
 
+def _dump_json(d, f):
+    json.dump(d, f, indent="  ")
+
+
+def _dump_yaml(d, f):
+    import yaml
+
+    yaml.dump(d, f, yaml.SafeDumper)
+
+
+# Serialization backends by file extension.
+# json is needed for hashing anyway, yaml is imported on first use.
+DUMPERS = {".json": _dump_json, ".yaml": _dump_yaml}
+
+
+@timed("parse.dump")
+def dump(d: dict, filename: str):
+    """Write d to filename, choosing the serialization backend by extension."""
+    ext = os.path.splitext(filename)[1]
+    try:
+        dumper = DUMPERS[ext]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {ext!r}") from None
+
+    with open(filename, "w") as f:
+        dumper(d, f)
+
+
 if __name__ == "__main__":
     import argparse
+    import contextlib
+    import sys
     from pprint import pprint
-    import os.path
-    import json
-    import yaml
 
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(prog="python -m silverturtle.parse")
     parser.add_argument("taxonomy_fn")
     parser.add_argument("--output", "-o")
     parser.add_argument("--list", "-l", action="store_true")
     parser.add_argument("--id", action="store_true")
+    parser.add_argument("--hash", action="store_true")
+    parser.add_argument(
+        "--profile", action="store_true", help="Print a per-stage timing breakdown"
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="Parse in parallel using this many processes (the AST is not printed)",
+    )
     args = parser.parse_args()
 
-    with open(args.taxonomy_fn) as f:
-        ast = gen_ast(f)
+    with profile() if args.profile else contextlib.nullcontext() as profiler:
+        with open(args.taxonomy_fn) as f:
+            if args.jobs:
+                d = parse_parallel(f, max_workers=args.jobs)
+            else:
+                ast = gen_ast(f)
+                print(format_block(ast))
+                d = ast2dict(ast)
 
-    print(format_block(ast))
+        if args.id:
+            d = insert_id(d)
 
-    d = ast2dict(ast)
+        if args.hash:
+            d = insert_hash(d)
 
-    if args.id:
-        d = insert_id(d)
+        if args.list:
+            d = children_to_list(d, "Root")
 
-    if args.list:
-        d = children_to_list(d, "Root")
+        pprint(d)
 
-    pprint(d)
+        if args.output:
+            dump(d, args.output)
 
-    if args.output:
-        ext = os.path.splitext(args.output)[1]
-        if ext == ".json":
-            with open(args.output, "w") as f:
-                json.dump(d, f, indent="  ")
-        elif ext == ".yaml":
-            with open(args.output, "w") as f:
-                yaml.dump(d, f, yaml.SafeDumper)
+    if profiler is not None:
+        print(profiler.report(), file=sys.stderr)
@@ -2,6 +2,13 @@ import textwrap
 from typing import Iterable, List, Mapping, Optional, TypeVar
 import re
 import itertools
+import json
+import mmap
+import threading
+import weakref
+from collections import OrderedDict
+
+from .instrument import timed
 
 
 def sorted_if(it, sort, *, key=None):
@@ -66,6 +73,7 @@ class Tag:
     def values(self):
         return ["" if p == "*" else p for p in self.parts]
 
+    @timed("tree.Tag.match")
     def match(self, query):
         query = query.lower()
 
@@ -94,11 +102,19 @@ class Node:
         tags: Optional[List[Tag]] = None,
         aliases: Optional[List[str]] = None,
         comment: Optional[str] = None,
+        id: Optional[str] = None,
+        store: Optional["CompiledStore"] = None,
+        child_offsets: Optional[List[int]] = None,
     ):
         self.name = name
         self.parent = parent
+        self.id = id
+
+        # Lazy nodes load their children from the store on first access
+        self._store = store
+        self._child_offsets = child_offsets
 
-        if children is None:
+        if children is None and store is None:
             children = []
 
         if tags is None:
@@ -107,18 +123,68 @@ class Node:
         if aliases is None:
             aliases = []
 
-        self.children = children
+        self._children = children
         self.tags = tags
         self.aliases = aliases
         self.comment = comment
 
+    @property
+    def children(self) -> List["Node"]:
+        if self._store is not None:
+            return self._store.children(self)
+
+        return self._children
+
+    @children.setter
+    def children(self, children: List["Node"]):
+        self._children = children
+
+    @property
+    def store(self) -> Optional["CompiledStore"]:
+        """Backing store of a lazy node, None for regular nodes."""
+        return self._store
+
+    @property
+    def expanded(self) -> bool:
+        """False if the children of a lazy node are not loaded."""
+        return self._children is not None
+
+    def collapse(self):
+        """Release the children of a lazy node. They are reloaded on next access."""
+        if self._store is not None:
+            self._children = None
+
     @classmethod
+    def open(cls, filename: str, *, max_expanded: Optional[int] = 1024):
+        """
+        Open a compiled tree (see compile_tree) in lazy mode.
+
+        Children are loaded on first access. At most max_expanded nodes keep
+        their children loaded, the least recently used are collapsed.
+
+        The file stays open until root.store.close() is called.
+        Alternatively, use CompiledStore as a context manager.
+        """
+        return CompiledStore(filename, max_expanded=max_expanded).root()
+
+    @classmethod
+    @timed("tree.Node.from_dict")
     def from_dict(
         cls,
         data: Mapping,
         *,
         name: Optional[str] = None,
         parent: Optional["Node"] = None,
+    ):
+        return cls._from_dict(data, name=name, parent=parent)
+
+    @classmethod
+    def _from_dict(
+        cls,
+        data: Mapping,
+        *,
+        name: Optional[str] = None,
+        parent: Optional["Node"] = None,
     ):
         if not data:
             data = {}
@@ -129,14 +195,30 @@ class Node:
         tags = [Tag.from_dict(v, name=k) for k, v in data.get("tags", {}).items()]
         aliases = data.get("aliases", [])
         comment = data.get("comment", None)
+        id = data.get("id", None)
 
-        node = cls(name, parent=parent, tags=tags, aliases=aliases, comment=comment)
+        node = cls(
+            name, parent=parent, tags=tags, aliases=aliases, comment=comment, id=id
+        )
         node.children = [
-            cls.from_dict(c, name=n, parent=node)
+            cls._from_dict(c, name=n, parent=node)
             for n, c in data.get("children", {}).items()
         ]
         return node
 
+    def walk(self) -> Iterable["Node"]:
+        """Iterate over this node and all of its descendants in pre-order."""
+        yield self
+        for c in self.children:
+            yield from c.walk()
+
+    @property
+    def path(self) -> List[str]:
+        """Names of all ancestors (excluding the root) and this node."""
+        if self.parent is None:
+            return []
+        return self.parent.path + [self.name]
+
     def format(self, indent=2, sort=True):
         result = [f"{self.name}::"]
 
@@ -170,3 +252,124 @@ class Node:
 
     def __str__(self):
         return self.format()
+
+
+def compile_tree(data: Mapping, filename: str):
+    """
+    Write data (see Node.from_dict) to filename for lazy loading with Node.open.
+
+    Each node is written as one JSON line that holds the byte offsets of its
+    children. The first line holds the offset of the root node.
+    """
+
+    def _write(f, data: Optional[Mapping], name: str) -> int:
+        if not data:
+            data = {}
+
+        child_offsets = [_write(f, c, n) for n, c in data.get("children", {}).items()]
+
+        record = {k: v for k, v in data.items() if k != "children"}
+        record["name"] = name
+        record["children"] = child_offsets
+
+        offset = f.tell()
+        f.write(json.dumps(record).encode("utf-8") + b"\n")
+        return offset
+
+    with open(filename, "wb") as f:
+        header = b"%020d\n"
+        f.write(header % 0)
+        root_offset = _write(f, data, "")
+        f.seek(0)
+        f.write(header % root_offset)
+
+
+class CompiledStore:
+    """
+    Backing store of lazy nodes (see Node.open).
+
+    The file is memory-mapped, so nodes can be loaded from multiple threads.
+
+    Loaded nodes are cached by offset as long as they are referenced,
+    so that reloading the children of a collapsed node returns the same
+    objects where these are still in use.
+    """
+
+    def __init__(self, filename: str, *, max_expanded: Optional[int] = 1024):
+        self.max_expanded = max_expanded
+        self._f = open(filename, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._lock = threading.RLock()
+        self._nodes: "weakref.WeakValueDictionary[int, Node]" = (
+            weakref.WeakValueDictionary()
+        )
+        self._expanded: "OrderedDict[Node, None]" = OrderedDict()
+
+    def _read(self, offset: int) -> bytes:
+        end = self._mm.find(b"\n", offset)
+        return self._mm[offset:end]
+
+    def root(self) -> Node:
+        return self.load(int(self._read(0)))
+
+    def load(self, offset: int, *, parent: Optional[Node] = None) -> Node:
+        with self._lock:
+            node = self._nodes.get(offset)
+            if node is not None:
+                return node
+
+            record = json.loads(self._read(offset))
+
+            tags = [Tag.from_dict(v, name=k) for k, v in record.get("tags", {}).items()]
+
+            node = self._nodes[offset] = Node(
+                record["name"],
+                parent=parent,
+                tags=tags,
+                aliases=record.get("aliases", []),
+                comment=record.get("comment", None),
+                id=record.get("id", None),
+                store=self,
+                child_offsets=record["children"],
+            )
+            return node
+
+    def children(self, node: Node) -> List[Node]:
+        """Return the children of node, loading them if necessary."""
+        with self._lock:
+            children = node._children
+
+            if children is None:
+                children = node._children = [
+                    self.load(offset, parent=node)
+                    for offset in node._child_offsets or []
+                ]
+
+            # Only nodes with children use up the budget
+            if children:
+                self.touch(node)
+
+            return children
+
+    def touch(self, node: Node):
+        """Mark node as recently used and collapse the least recently used nodes."""
+        with self._lock:
+            self._expanded[node] = None
+            self._expanded.move_to_end(node)
+
+            if self.max_expanded is None:
+                return
+
+            while len(self._expanded) > self.max_expanded:
+                lru, _ = self._expanded.popitem(last=False)
+                lru.collapse()
+
+    def close(self):
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,174 @@
+import uuid
+
+import pytest
+
+from silverturtle.columnar import (
+    AnnotationWriter,
+    iter_dataframes,
+    read_annotations,
+    to_dataframes,
+)
+from silverturtle.parse import insert_id
+from silverturtle.tree import Node
+
+np = pytest.importorskip("numpy")
+
+TREE_DATA = {
+    "children": {
+        "Living": {"children": {"Copepoda": {}, "Mollusca": {}}},
+        "Detritus": {},
+    }
+}
+
+
+@pytest.fixture
+def tree():
+    return Node.from_dict(insert_id(TREE_DATA))
+
+
+def _write(tree, directory, chunk_size):
+    taxon_ids = {"/".join(n.path): n.id for n in tree.walk()}
+
+    with AnnotationWriter(str(directory), tree, chunk_size=chunk_size) as writer:
+        writer.add("obj0", taxon_ids["Living/Copepoda"], [(("sex", "female"), False)])
+        writer.add("obj1", None, [(("badfocus",), True), (("sex", "female"), False)])
+        writer.add("obj2", taxon_ids["Detritus"])
+
+    return writer
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 10])
+def test_roundtrip(tree, tmp_path, chunk_size):
+    writer = _write(tree, tmp_path, chunk_size)
+
+    assert writer.n_chunks == -(-3 // chunk_size)
+
+    columns = read_annotations(str(tmp_path))
+
+    assert columns["object_id"].tolist() == ["obj0", "obj1", "obj2"]
+    assert [writer.taxa[t] if t >= 0 else None for t in columns["taxon"]] == [
+        "Living/Copepoda",
+        None,
+        "Detritus",
+    ]
+    assert columns["tag_object"].tolist() == [0, 1, 1]
+    assert columns["tag"].tolist() == [0, 1, 0]
+    assert columns["positive"].tolist() == [True, False, True]
+
+
+def test_mmap(tree, tmp_path):
+    _write(tree, tmp_path, 10)
+
+    columns = read_annotations(str(tmp_path), mmap=True)
+
+    assert isinstance(columns["taxon"], np.memmap)
+
+
+def test_unknown_taxon(tree, tmp_path):
+    with pytest.raises(ValueError):
+        AnnotationWriter(str(tmp_path), tree).add("obj0", "unknown")
+
+
+def test_to_dataframes(tree, tmp_path):
+    pytest.importorskip("pandas")
+
+    _write(tree, tmp_path, 2)
+
+    objects, tags = to_dataframes(str(tmp_path))
+
+    assert objects["taxon"].tolist()[0] == "Living/Copepoda"
+    assert tags["tag"].tolist() == ["sex=female", "badfocus", "sex=female"]
+
+
+def test_iter_dataframes(tree, tmp_path):
+    pytest.importorskip("pandas")
+
+    _write(tree, tmp_path, 2)
+
+    chunks = list(iter_dataframes(str(tmp_path)))
+
+    assert [len(objects) for objects, _ in chunks] == [2, 1]
+    assert chunks[1][0]["taxon"].tolist() == ["Detritus"]
+    assert chunks[1][1]["tag_object"].tolist() == []
+
+
+def test_iter_dataframes_join(tree, tmp_path):
+    pytest.importorskip("pandas")
+
+    with AnnotationWriter(str(tmp_path), tree, chunk_size=2) as writer:
+        for i in range(5):
+            writer.add(f"obj{i}", None, [((f"tag{i}",), False)])
+
+    joined = [
+        tags.join(objects, on="tag_object")
+        for objects, tags in iter_dataframes(str(tmp_path))
+    ]
+
+    assert [j["object_id"].tolist() for j in joined] == [
+        ["obj0", "obj1"],
+        ["obj2", "obj3"],
+        ["obj4"],
+    ]
+    assert [j["tag"].tolist() for j in joined][1] == ["tag2", "tag3"]
+
+
+def test_writer_abort(tree, tmp_path):
+    with pytest.raises(RuntimeError):
+        with AnnotationWriter(str(tmp_path), tree, chunk_size=2) as writer:
+            for i in range(3):
+                writer.add(f"obj{i}", None)
+            raise RuntimeError("Connection lost")
+
+    # The export is not marked complete
+    with pytest.raises(FileNotFoundError):
+        read_annotations(str(tmp_path))
+
+
+def test_to_dataframes_tag_names_with_colon(tree, tmp_path):
+    pytest.importorskip("pandas")
+
+    with AnnotationWriter(str(tmp_path), tree) as writer:
+        writer.add("obj0", None, [(("a:b",), False), (("a", "b"), False)])
+
+    _, tags = to_dataframes(str(tmp_path))
+
+    assert tags["tag"].tolist() == ["a:b", "a=b"]
+
+
+def test_export_annotations(tree, tmp_path):
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    pytest.importorskip("sqlalchemy_utils")
+    from sqlalchemy.orm import Session
+
+    from silverturtle.db import Base, Object, ObjectTag, export_annotations
+
+    taxon_ids = {"/".join(n.path): n.id for n in tree.walk()}
+
+    engine = sqlalchemy.create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Object.__table__, ObjectTag.__table__])
+
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Object(id="obj0", taxon_id=uuid.UUID(taxon_ids["Living/Copepoda"])),
+                Object(id="obj1"),
+                ObjectTag(object_id="obj0", tag=["sex", "female"], reject=False),
+                ObjectTag(object_id="obj1", tag=["badfocus"], reject=True),
+            ]
+        )
+        session.commit()
+
+        writer = export_annotations(session, tree, str(tmp_path), chunk_size=1)
+
+    assert writer.n_chunks == 2
+
+    columns = read_annotations(str(tmp_path))
+
+    assert columns["object_id"].tolist() == ["obj0", "obj1"]
+    assert columns["taxon"].tolist() == [writer.taxa.index("Living/Copepoda"), -1]
+    assert columns["tag_object"].tolist() == [0, 1]
+    assert [writer.tag_paths[t] for t in columns["tag"]] == [
+        ("sex", "female"),
+        ("badfocus",),
+    ]
+    assert columns["positive"].tolist() == [True, False]
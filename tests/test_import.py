@@ -0,0 +1,53 @@
+import importlib.util
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ("sqlalchemy", "sqlalchemy_utils", "yaml")
+
+LIGHT_MODULES = ("silverturtle.parse", "silverturtle.tree", "silverturtle.db")
+
+
+def _run(code: str):
+    return subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+
+
+def _loaded_modules(code: str):
+    return _run(f"import sys; {code}; print(' '.join(sorted(sys.modules)))").split()
+
+
+@pytest.mark.parametrize("heavy", HEAVY_MODULES)
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_import_is_light(module, heavy):
+    # Only meaningful if the heavy module could be imported at all
+    pytest.importorskip(heavy)
+
+    assert heavy not in _loaded_modules(f"import {module}")
+
+
+def test_db_loads_sqlalchemy_on_access():
+    pytest.importorskip("sqlalchemy")
+
+    assert "sqlalchemy" in _loaded_modules("import silverturtle.db as db; db.metadata")
+
+
+def test_db_unknown_attribute():
+    import silverturtle.db
+
+    with pytest.raises(AttributeError):
+        silverturtle.db.DoesNotExist
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("pytest_benchmark") is None,
+    reason="pytest-benchmark not installed",
+)
+def test_import_time(benchmark):
+    benchmark.pedantic(
+        _run,
+        args=("import silverturtle.parse, silverturtle.tree",),
+        rounds=10,
+    )
@@ -0,0 +1,144 @@
+import functools
+import importlib.util
+import timeit
+
+import pytest
+
+from silverturtle import instrument
+from silverturtle.parse import ast2dict, gen_ast, parse_parallel
+from silverturtle.tree import Node, Tag
+
+SOURCE = ["Foo::\n", "  tag~=A|B\n", "  Bar::\n", "    Baz::\n"]
+
+
+def test_disabled():
+    assert not instrument._hooks
+
+    # Generator functions still work without hooks
+    tag = Tag("tag", "A|B", None)
+    assert list(tag.match("a")) == ["tag=A", "tag=B", "tag=A"]
+
+
+def test_profile():
+    with instrument.profile() as profiler:
+        d = ast2dict(gen_ast(SOURCE))
+        tree = Node.from_dict(d)
+        list(tree.children[0].tags[0].match("b"))
+
+    assert not instrument._hooks
+
+    # Recursive calls are only counted once
+    assert profiler.timings["parse.gen_ast"][0] == 1
+    assert profiler.timings["parse.ast2dict"][0] == 1
+    assert profiler.timings["tree.Node.from_dict"][0] == 1
+    assert profiler.timings["tree.Tag.match"][0] == 1
+    assert profiler.counters["parse.lines"] == len(SOURCE)
+
+    report = profiler.report()
+    assert "parse.gen_ast" in report
+    assert "parse.lines" in report
+
+
+def test_custom_hook():
+    events = []
+
+    class RecordingHook(instrument.Hook):
+        def timing(self, stage, seconds):
+            events.append(stage)
+
+    hook = RecordingHook()
+    instrument.add_hook(hook)
+    try:
+        gen_ast(SOURCE)
+    finally:
+        instrument.remove_hook(hook)
+
+    assert events == ["parse.gen_ast"]
+
+
+def test_profile_parallel():
+    lines = SOURCE * 50
+
+    with instrument.profile() as profiler:
+        parse_parallel(lines, max_workers=2, chunk_size=20, min_lines=0)
+
+    assert profiler.counters["parse.lines"] == len(lines)
+    assert "worker.parse.gen_ast" in profiler.timings
+    assert profiler.timings["parse.parse_parallel"][0] == 1
+
+
+def test_instrument_engine():
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+
+    engine = sqlalchemy.create_engine("sqlite://")
+    instrument.instrument_engine(engine)
+
+    with instrument.profile() as profiler:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("create table t (x integer)")
+            conn.exec_driver_sql("insert into t values (1), (2), (3)")
+            assert len(conn.exec_driver_sql("select * from t").all()) == 3
+
+    assert profiler.timings["sql"][0] == 3
+    assert profiler.statements["insert into t values (1), (2), (3)"][2] == 3
+    # SQLite does not report the number of selected rows
+    assert profiler.statements["select * from t"][2] is None
+    assert profiler.counters["sql.rows"] == 3
+
+    report = profiler.report()
+    assert "select * from t" in report
+
+
+def _make_tree_data(depth, width):
+    data = {"tags": {"part": {"pattern": "?|head|tail"}}}
+    if depth:
+        data["children"] = {
+            f"Node{i}": _make_tree_data(depth - 1, width) for i in range(width)
+        }
+    return data
+
+
+OVERHEAD_TREE_DATA = _make_tree_data(4, 8)
+
+
+def test_disabled_overhead():
+    assert not instrument._hooks
+
+    # Disabled generator wrappers return the generator of the function itself
+    tag = Tag("tag", "A|B", None)
+    assert tag.match("a").gi_code is Tag.match.__wrapped__.__code__
+
+    # Recursive functions pay for the wrapper only once
+    raw_from_dict = functools.partial(Node.from_dict.__wrapped__, Node)
+    wrapped = min(
+        timeit.repeat(lambda: Node.from_dict(OVERHEAD_TREE_DATA), number=3, repeat=5)
+    )
+    raw = min(
+        timeit.repeat(lambda: raw_from_dict(OVERHEAD_TREE_DATA), number=3, repeat=5)
+    )
+    assert wrapped < 1.2 * raw
+
+
+requires_benchmark = pytest.mark.skipif(
+    importlib.util.find_spec("pytest_benchmark") is None,
+    reason="pytest-benchmark not installed",
+)
+
+
+@requires_benchmark
+@pytest.mark.parametrize("instrumented", [False, True])
+def test_benchmark_disabled_overhead_from_dict(benchmark, instrumented):
+    benchmark.group = "instrument-overhead-from_dict"
+    if instrumented:
+        benchmark(Node.from_dict, OVERHEAD_TREE_DATA)
+    else:
+        benchmark(Node.from_dict.__wrapped__, Node, OVERHEAD_TREE_DATA)
+
+
+@requires_benchmark
+@pytest.mark.parametrize("instrumented", [False, True])
+def test_benchmark_disabled_overhead_match(benchmark, instrumented):
+    benchmark.group = "instrument-overhead-match"
+    tag = Tag("tag", "A|B|{1..50}", None)
+    match = tag.match if instrumented else Tag.match.__wrapped__.__get__(tag)
+    benchmark(lambda: list(match("a")))
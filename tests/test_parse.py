@@ -1,13 +1,30 @@
+import copy
+import importlib.util
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
 from silverturtle.parse import (
     Block,
     Comment,
     LineComment,
     Node,
+    ParserError,
     Tag,
+    ast2dict,
     compare_blocks,
     gen_ast,
+    insert_hash,
+    insert_id,
+    node_id,
+    parse_parallel,
     Blank,
     split_block_comment,
+    split_sections,
+    subtree_hash,
 )
 
 
@@ -76,3 +93,141 @@ def test_split_block_comment_fail():
 
     assert result[0] == []
     assert result[1] == content
+
+
+TREE_DICT = {
+    "tags": {"part": {"pattern": "?|head|tail", "multi": False}},
+    "children": {
+        "Living": {"children": {"Copepoda": {}, "Mollusca": {"meta": {"a": "1"}}}},
+        "Detritus": {"id": "detritus"},
+    },
+}
+
+
+def test_insert_id_stable():
+    d1 = insert_id(TREE_DICT)
+    d2 = insert_id(TREE_DICT)
+
+    assert d1 == d2
+    assert d1["children"]["Detritus"]["id"] == "detritus"
+
+    copepoda = d1["children"]["Living"]["children"]["Copepoda"]
+    assert copepoda["id"] == node_id("Copepoda", d1["children"]["Living"]["id"])
+
+
+def test_insert_id_none_children():
+    d = insert_id({"children": {"Calanoida": None}})
+
+    assert d["children"]["Calanoida"]["id"] == node_id("Calanoida", d["id"])
+
+
+def test_subtree_hash():
+    d = insert_hash(TREE_DICT)
+
+    assert d["hash"] == subtree_hash(TREE_DICT)
+    assert d["hash"] == subtree_hash(insert_id(TREE_DICT))
+
+    changed = copy.deepcopy(TREE_DICT)
+    changed["children"]["Living"]["children"]["Mollusca"]["meta"]["a"] = "2"
+    d_changed = insert_hash(changed)
+
+    assert d_changed["hash"] != d["hash"]
+    assert (
+        d_changed["children"]["Living"]["hash"] != d["children"]["Living"]["hash"]
+    )
+    assert (
+        d_changed["children"]["Detritus"]["hash"] == d["children"]["Detritus"]["hash"]
+    )
+
+
+def _make_source(n):
+    lines = ["# Header", ""]
+    for i in range(n):
+        lines.extend(
+            [
+                f"Node{i}::",
+                "  # Comment",
+                "  tag~=A|B",
+                "",
+                f"  Child{i}::",
+                "    meta=1",
+                "",
+                f"key{i}=v",
+                f"=alias{i}",
+                "",
+            ]
+        )
+    return [l + "\n" for l in lines]
+
+
+def test_split_sections():
+    lines = _make_source(10)
+
+    chunks = split_sections(lines, 10)
+
+    assert len(chunks) > 1
+    assert sum((c for _, c in chunks), []) == lines
+    for line_offset, chunk in chunks[1:]:
+        assert chunk[0].startswith("Node")
+        assert lines[line_offset] == chunk[0]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 20, 50])
+def test_parse_parallel(chunk_size):
+    lines = _make_source(50)
+
+    d = parse_parallel(lines, max_workers=2, chunk_size=chunk_size, min_lines=0)
+
+    assert d == ast2dict(gen_ast(lines))
+    assert list(d["children"]) == [f"Node{i}" for i in range(50)]
+    assert len(d["meta"]) == len(d["aliases"]) == 50
+
+
+def test_parse_parallel_error_line_no():
+    lines = _make_source(50)
+    lines[300] = "  ~~~\n"
+
+    with pytest.raises(ParserError, match="line 301"):
+        parse_parallel(lines, max_workers=2, chunk_size=20, min_lines=0)
+
+
+BENCHMARK_LINES = _make_source(20000)
+
+requires_benchmark = pytest.mark.skipif(
+    importlib.util.find_spec("pytest_benchmark") is None,
+    reason="pytest-benchmark not installed",
+)
+
+
+@requires_benchmark
+def test_benchmark_parse_serial(benchmark):
+    benchmark.group = "parse"
+    benchmark(lambda: ast2dict(gen_ast(BENCHMARK_LINES)))
+
+
+@requires_benchmark
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="Requires multiple CPUs")
+def test_benchmark_parse_parallel(benchmark):
+    benchmark.group = "parse"
+    benchmark(lambda: parse_parallel(BENCHMARK_LINES, min_lines=0))
+
+
+@pytest.mark.parametrize("as_module", [False, True])
+def test_cli(as_module, tmp_path):
+    root = pathlib.Path(__file__).parents[1]
+    if as_module:
+        cmd = [sys.executable, "-m", "silverturtle.parse"]
+    else:
+        cmd = [sys.executable, str(root / "silverturtle" / "parse.py")]
+
+    args = [str(root / "taxonomy.stml"), "--profile", "-o", str(tmp_path / "t.json")]
+    result = subprocess.run(
+        cmd + args,
+        cwd=root,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    assert "parse.gen_ast" in result.stderr
+    assert (tmp_path / "t.json").exists()
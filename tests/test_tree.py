@@ -1,4 +1,6 @@
-from silverturtle.tree import Node
+import concurrent.futures
+
+from silverturtle.tree import CompiledStore, Node, compile_tree
 
 TREE_DATA = {
     "tags": {
@@ -78,3 +80,64 @@ TREE_DATA = {
 def test_from_dict():
     tree = Node.from_dict(TREE_DATA)
     print(tree)
+
+
+def test_lazy(tmp_path):
+    fn = str(tmp_path / "tree.jsonl")
+    compile_tree(TREE_DATA, fn)
+
+    eager = Node.from_dict(TREE_DATA)
+    lazy = Node.open(fn)
+
+    assert not lazy.expanded
+    assert lazy.format() == eager.format()
+    assert [n.path for n in lazy.walk()] == [n.path for n in eager.walk()]
+    assert lazy.comment == eager.comment
+    assert [t.name for t in lazy.tags] == [t.name for t in eager.tags]
+
+
+def test_lazy_lru(tmp_path):
+    fn = str(tmp_path / "tree.jsonl")
+    compile_tree(TREE_DATA, fn)
+
+    root = Node.open(fn, max_expanded=2)
+
+    living, detritus, artifact = (root.children[i] for i in (0, 1, 3))
+    assert [c.name for c in detritus.children] == ["Aggregate", "Fiber"]
+    assert [c.name for c in artifact.children] == ["Bubble", "Scratch", "Seafloor"]
+
+    # The least recently used nodes were collapsed
+    assert not root.expanded
+    assert detritus.expanded and artifact.expanded
+    assert not living.expanded
+
+    # ... and are reloaded on access, returning the nodes that are still in use
+    assert [c.name for c in root.children][:2] == ["Living", "Detritus"]
+    assert detritus in root.children
+    assert detritus.parent is root
+
+
+def test_lazy_leaves_not_tracked(tmp_path):
+    fn = str(tmp_path / "tree.jsonl")
+    compile_tree(TREE_DATA, fn)
+
+    with CompiledStore(fn, max_expanded=None) as store:
+        nodes = list(store.root().walk())
+
+        assert len(store._expanded) == sum(1 for n in nodes if n.children)
+        assert len(store._expanded) < len(nodes)
+
+
+def test_lazy_threads(tmp_path):
+    fn = str(tmp_path / "tree.jsonl")
+    compile_tree(TREE_DATA, fn)
+
+    expected = Node.from_dict(TREE_DATA).format()
+
+    root = Node.open(fn, max_expanded=3)
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: root.format(), range(32)))
+
+    root.store.close()
+
+    assert results == [expected] * 32